@@ -87,12 +87,14 @@ class Grid:
     ):
         if length is None:
             length = self.width - x
+        assert 0 <= x and x + length <= self.width
+        assert 0 <= y < self.height
         if variegate.any():
-            for i in range(0, length):
-                self.set(x + i, y, obj_type(add=variegate[i]))
+            cells = [obj_type(add=variegate[i]) for i in range(length)]
         else:
-            for i in range(0, length):
-                self.set(x + i, y, obj_type())
+            cells = [obj_type() for _ in range(length)]
+        start = y * self.width + x
+        self.grid[start : start + length] = cells
 
     def vert_wall(
         self,
@@ -104,12 +106,14 @@ class Grid:
     ):
         if length is None:
             length = self.height - y
+        assert 0 <= x < self.width
+        assert 0 <= y and y + length <= self.height
         if variegate.any():
-            for j in range(0, length):
-                self.set(x, y + j, obj_type(add=variegate[j+100]))
+            cells = [obj_type(add=variegate[j + 100]) for j in range(length)]
         else:
-            for j in range(0, length):
-                self.set(x, y + j, obj_type())
+            cells = [obj_type() for _ in range(length)]
+        start = y * self.width + x
+        self.grid[start : start + length * self.width : self.width] = cells
 
     def wall_rect(self, x: int, y: int, w: int, h: int, obj_type: Callable[[], WorldObj] = Wall, variegate=np.array([0,0])):
         self.horz_wall(x, y, w, obj_type, variegate)
@@ -117,6 +121,35 @@ class Grid:
         self.vert_wall(x, y, h, obj_type, variegate)
         self.vert_wall(x + w - 1, y, h, obj_type, variegate)
 
+    def fill_rect(self, x: int, y: int, w: int, h: int, obj: WorldObj | None):
+        """
+        Set every cell of a rectangle to the same object, one row slice at a time
+        """
+        assert 0 <= x and x + w <= self.width
+        assert 0 <= y and y + h <= self.height
+        row = [obj] * w
+        for j in range(y, y + h):
+            start = j * self.width + x
+            self.grid[start : start + w] = row
+
+    def set_many(self, xs: np.ndarray, ys: np.ndarray, v: WorldObj | None):
+        """
+        Set every cell at the given x and y coordinates to the same object
+        """
+        xs = np.asarray(xs)
+        ys = np.asarray(ys)
+        assert ((0 <= xs) & (xs < self.width)).all()
+        assert ((0 <= ys) & (ys < self.height)).all()
+        cells = self.grid
+        for idx in (ys * self.width + xs).tolist():
+            cells[idx] = v
+
+    def clear(self):
+        """
+        Empty every cell in place, keeping the backing list
+        """
+        self.grid[:] = [None] * (self.width * self.height)
+
     def rotate_left(self) -> Grid:
         """
         Rotate the grid to the left (counter-clockwise)
@@ -1,8 +1,9 @@
 from minigrid.minigrid_env import *
 from minigrid.core.world_object import *
 from minigrid.core.mission import MissionSpace
+from minigrid.core.constants import COLOR_TO_IDX
+from minigrid.envs.shapes import SHAPE_TENSOR_FULL, stamp_shapes, wall_tile
 import random
-import numpy as np
 
 
 class LEnv(MiniGridEnv):
@@ -29,6 +30,7 @@ class LEnv(MiniGridEnv):
 
         self.new_obj_pos = new_obj_pos
         self.new_obj_color = None if self.new_obj_pos is None else "green"
+        self._layout_key = None
 
         mission_space = MissionSpace(mission_func=self._gen_mission)
         max_steps = kwargs.pop("max_steps", 10 * size * size)
@@ -42,77 +44,74 @@ class LEnv(MiniGridEnv):
         )
         self.action_space = spaces.Discrete(4)
 
+    @staticmethod
+    def _shape_locs(width, height):
+        return (
+            (width // 3 - 4, height // 3 - 4),
+            (2 * width // 3 - 2, height // 3 - 4),
+            (width // 3 - 3, 2 * height // 3 - 2),
+        )
+
     @staticmethod
     def _gen_mission():
         return "Reach the goal if there is one. Else wander around!"
 
     def _gen_grid(self, width, height, regenerate=True):
-        # Create an empty grid
-        self.grid = Grid(width, height)
-        
-        # Generate the surrounding walls
-        #Consider: walls at -1, rather than 0
-        self.grid.horz_wall(0,0)
-        self.grid.vert_wall(0,0)
-        self.grid.horz_wall(0,height-1)
-        self.grid.vert_wall(width-1,0)
-        for i in range(self.Lheight+1,height-1):
-            self.grid.horz_wall(self.Lwidth+1, i, length=width-self.Lwidth-1)
-        
-        # Place the agent
+        # The walls and shapes only depend on the configuration, so they are
+        # built once and copied into a fresh grid on every reset
+        layout_key = (width, height, self.Lwidth, self.Lheight, self.plus_color, self.new_obj_pos, self.new_obj_color)
+        if self._layout_key != layout_key:
+            self._build_layout(width, height)
+            self._layout_key = layout_key
+
+        # Every cell is overwritten below, so the previous episode's grid can
+        # be reused as is
+        if self.grid.width != width or self.grid.height != height:
+            self.grid = Grid(width, height)
+
+        # Place the agent. As when building from scratch, it is placed before
+        # the shapes so it may start on a shape tile.
         if self.agent_start_pos is not None:
             self.agent_pos = self.agent_start_pos
             self.agent_dir = self.agent_start_dir
         else:
+            self.grid.grid[:] = self._wall_cells
             self.place_agent()
-            
+
+        self.grid.grid[:] = self._layout_cells
+        self.mission = self._mission_cache
+
+    def _build_layout(self, width, height):
+        """
+        Build the static walls and shapes and keep copies of the cells
+        """
+        # Create an empty grid
+        self.grid = Grid(width, height)
+        
+        # Generate the surrounding walls
+        #Consider: walls at -1, rather than 0
+        self.grid.horz_wall(0,0, obj_type=wall_tile)
+        self.grid.vert_wall(0,0, obj_type=wall_tile)
+        self.grid.horz_wall(0,height-1, obj_type=wall_tile)
+        self.grid.vert_wall(width-1,0, obj_type=wall_tile)
+        self.grid.fill_rect(self.Lwidth+1, self.Lheight+1,
+                            width-self.Lwidth-1, height-self.Lheight-2, wall_tile())
+        self._wall_cells = list(self.grid.grid)
+
         #Place the shapes
-        triloc  =   (width/3-4,height/3-4)
-        plusloc =   (2*width/3-2,height/3-4)
-        xloc    =   (width/3-3,2*height/3-2)
-        self.place_shape('triangle',triloc,'blue')
-        self.place_shape('plus',plusloc, self.plus_color)
-        self.place_shape('x',xloc,'yellow')
+        triloc, plusloc, xloc = self._shape_locs(width, height)
+        stamp_shapes(self.grid, SHAPE_TENSOR_FULL, (
+            ('triangle', triloc, COLOR_TO_IDX['blue']),
+            ('plus', plusloc, COLOR_TO_IDX[self.plus_color]),
+            ('x', xloc, COLOR_TO_IDX['yellow']),
+        ))
 
         # Place the new obj if specified
-        self.mission = f"get to the new{self.new_obj_color} square"
         if self.new_obj_pos is not None and self.new_obj_color is not None:
             x, y = self.new_obj_pos
             self.put_obj(FloorBright(self.new_obj_color), x, y)
-    
-    
-    def place_shape(self,shape,pos,color):
-        """
-        Place a 6x6 shape with lower left corner at (x,y)
-        """
-        shapegrid={
-            'plus':np.array(
-                [[0,0,1,1,0,0],
-                 [0,0,1,1,0,0],
-                 [1,1,1,1,1,1],
-                 [1,1,1,1,1,1],
-                 [0,0,1,1,0,0],
-                 [0,0,1,1,0,0]]),
-            'triangle':np.array(
-                [[1,0,0,0,0,0],
-                 [1,1,0,0,0,0],
-                 [1,1,1,0,0,0],
-                 [1,1,1,1,0,0],
-                 [1,1,1,1,1,0],
-                 [1,1,1,1,1,1]]),
-            'x':np.array(
-                [[1,1,0,0,1,1],
-                 [1,1,1,1,1,1],
-                 [0,1,1,1,1,0],
-                 [0,1,1,1,1,0],
-                 [1,1,1,1,1,1],
-                 [1,1,0,0,1,1]]),
-            }
-            
-        shapecoords = np.transpose(np.nonzero(shapegrid[shape]))+np.array(pos,dtype='int32')
-
-        for coord in shapecoords:
-            self.put_obj(Floor(color), coord[0], coord[1])
+        self._layout_cells = list(self.grid.grid)
+        self._mission_cache = f"get to the new{self.new_obj_color} square"
         
 
 # LEnv variants:
@@ -1,11 +1,61 @@
+from __future__ import annotations
+
 import random
-import numpy as np
+from functools import partial
 
 from minigrid.core.grid import Grid
 from minigrid.core.mission import MissionSpace
-from minigrid.core.world_object import Floor
 from minigrid.minigrid_env import MiniGridEnv
-from minigrid.core.constants import PATTERNS, IDX_TO_COLOR
+from minigrid.envs.shapes import SHAPE_TENSOR_DONUT, stamp_shapes, wall_tile
+from minigrid.core.constants import COLOR_TO_IDX, PATTERNS, IDX_TO_COLOR
+
+
+# Shape drawn for each letter of `order`, and the color attribute it uses
+_SHAPE_META = {
+    'T': ('triangle', 'tri_color'),
+    'P': ('dash', 'plus_color'),
+    'X': ('x', 'x_color'),
+    'D': ('dash', 'tri_color'),
+}
+
+
+def _stamp_layout(wall_cells, layout_cells, grid, place_agent):
+    cells = grid.grid
+    cells[:] = wall_cells
+    # The agent is placed before the shapes so it may start on one
+    place_agent()
+    cells[:] = layout_cells
+
+
+def _make_stamp_fn(width, height, Lwidth, stamps):
+    """
+    Build the walls and shapes of a donut room once and return a function
+    that writes them into a grid, calling `place_agent` between the two
+    """
+    grid = Grid(width, height)
+
+    # Generate the surrounding walls
+    #Consider: walls at -1, rather than 0
+    grid.horz_wall(0,0, obj_type=wall_tile)
+    grid.vert_wall(0,0, obj_type=wall_tile)
+    grid.horz_wall(0,height-1, obj_type=wall_tile)
+    grid.vert_wall(width-1,0, obj_type=wall_tile)
+
+    offset=6
+
+    # x_diam = 8
+    x_diam = 7
+    y_diam = 4
+
+    # for i in range(int(height/2)-y_diam,int(height/2)+y_diam):
+    grid.fill_rect(Lwidth//2, height//2-3, x_diam, 7, wall_tile())
+    wall_cells = list(grid.grid)
+
+    stamp_shapes(grid, SHAPE_TENSOR_DONUT, stamps)
+    layout_cells = grid.grid
+
+    # A partial rather than a closure keeps the environment picklable
+    return partial(_stamp_layout, wall_cells, layout_cells)
 
 
 class Square_Donut_Env(MiniGridEnv):
@@ -47,137 +97,102 @@ class Square_Donut_Env(MiniGridEnv):
             **kwargs
         )
 
+        self._stamp_key = None
+
+    # Shape positions: the four slots filled according to `order`, then four
+    # bars along the top and four along the bottom of the map. Subclasses with
+    # a fixed size set these directly instead of computing them every reset.
+    SHAPE_LOCS: tuple[tuple[int, int], ...] | None = None
+
+    @staticmethod
+    def _shape_locs(width, height):
+        w3, h3 = width // 3, height // 3
+        return (
+            (w3 - 4, h3 - 4), (2 * width // 3 - 1, h3 - 1),
+            (w3 - 3, 2 * height // 3 - 2), (2 * width // 3 - 2, 2 * height // 3 - 2),
+            (w3 - 1, h3 - 5), (w3, h3 - 5), (w3 + 1, h3 - 5), (w3 + 2, h3 - 5),
+            (w3 - 3, h3 + 6), (w3 - 2, h3 + 6), (w3 - 1, h3 + 6), (w3, h3 + 6),
+        )
 
     @staticmethod
     def _gen_mission():
         return "just fool around buddy"
 
+    def _layout_stamps(self, width, height):
+        """
+        Return the (shape name, position, color id) stamps of the map
+        """
+        loc = self.SHAPE_LOCS or self._shape_locs(width, height)
+
+        # The ordered shapes, then the bars on the bottom and top of the map
+        stamps = [
+            (shape, pos, COLOR_TO_IDX[getattr(self, color_attr)])
+            for (shape, color_attr), pos in zip((_SHAPE_META[char] for char in self.order), loc)
+        ]
+        x_color_id, plus_color_id = COLOR_TO_IDX[self.x_color], COLOR_TO_IDX[self.plus_color]
+        stamps += [('plus', pos, x_color_id) for pos in loc[4:8]]
+        stamps += [('plus', pos, plus_color_id) for pos in loc[8:]]
+        return stamps
+
+    def _place_agent(self):
+        if self.agent_start_pos is not None:
+            self.agent_pos = self.agent_start_pos
+            self.agent_dir = self.agent_start_dir
+        else:
+            self.place_agent()
+
     def _gen_grid(self, width, height, regenerate=True):
         if regenerate:
-            # Create an empty grid
-            self.grid = Grid(width, height)
-            
-            # Generate the surrounding walls
-            #Consider: walls at -1, rather than 0
-            self.grid.horz_wall(0,0)
-            self.grid.vert_wall(0,0)
-            self.grid.horz_wall(0,height-1)
-            self.grid.vert_wall(width-1,0)
-
-            offset=6
-
-            # x_diam = 8
-            x_diam = 7
-            y_diam = 4
-
-            # for i in range(int(height/2)-y_diam,int(height/2)+y_diam):
-            for i in range(int(height/2)-3,int(height/2)+4):
-                self.grid.horz_wall(int(self.Lwidth/2), i, length=x_diam)
-            
-
-            
-            # Place the agent
-            if self.agent_start_pos is not None:
-                self.agent_pos = self.agent_start_pos
-                self.agent_dir = self.agent_start_dir
-            else:
-                self.place_agent()
-                
-            #Place the shapes
-            triloc  =   (width/3-4,height/3-4)
-            plusloc =   (2*width/3-2,height/3-4)
-            xloc    =   (width/3-3,2*height/3-2)
-            dashloc =   (2*width/3-2,2*height/3-2)
-
-            loc = [(width/3-4,height/3-4), (2*width/3-1,height/3-1), (width/3-3,2*height/3-2), (2*width/3-2,2*height/3-2)]
-
-            shapes = {}
-
-            shapes['T'] = {'name': 'triangle', 'color': self.tri_color}
-            shapes['P'] = {'name': 'dash', 'color': self.plus_color}
-            shapes['X'] = {'name': 'x', 'color': self.x_color}
-            shapes['D'] = {'name': 'dash', 'color': self.tri_color}
-
-            # Create dictionary 
-
-            for idx, char in enumerate(self.order):
-                self.place_shape(shapes[char]['name'], loc[idx], shapes[char]['color'])
-
-            #Adding shapes on the bottom and top of the map
-            self.place_shape('plus', (width/3-1,height/3-5), self.x_color)
-            self.place_shape('plus', (width/3,height/3-5), self.x_color)
-            self.place_shape('plus', (width/3+1,height/3-5), self.x_color)
-            self.place_shape('plus', (width/3+2,height/3-5), self.x_color)
-            self.place_shape('plus', (width/3-3,height/3+6), self.plus_color)
-            self.place_shape('plus', (width/3-2,height/3+6), self.plus_color)
-            self.place_shape('plus', (width/3-1,height/3+6), self.plus_color)
-            self.place_shape('plus', (width/3,height/3+6), self.plus_color)
+            # The layout only depends on the configuration, so it is baked
+            # into a stamp function that is rebuilt only when that changes
+            stamp_key = (width, height, self.Lwidth, self.SHAPE_LOCS, self.order, self.tri_color, self.plus_color, self.x_color)
+            if self._stamp_key != stamp_key:
+                self._stamp_fn = _make_stamp_fn(
+                    width, height, self.Lwidth, self._layout_stamps(width, height)
+                )
+                self._stamp_key = stamp_key
+
+            # Every cell is overwritten by the stamp, so the previous
+            # episode's grid can be reused as is
+            if self.grid.width != width or self.grid.height != height:
+                self.grid = Grid(width, height)
+            self._stamp_fn(self.grid, self._place_agent)
 
             self.mission = "get to the green goal square"
         else:
-            # Place the agent
-            if self.agent_start_pos is not None:
-                self.agent_pos = self.agent_start_pos
-                self.agent_dir = self.agent_start_dir
-            else:
-                self.place_agent()
-    
-    
-    def place_shape(self,shape,pos,color):
-        """
-        Place a 6x6 shape with lower left corner at (x,y)
-        """
-        shapegrid={
-            'plus':np.array(
-                [[0,0,0,0,0,0],
-                 [0,0,0,0,0,0],
-                 [0,0,0,0,0,0],
-                 [0,0,0,0,0,0],
-                 [0,0,0,0,0,0],
-                 [0,0,1,1,0,0]]),
-            'triangle':np.array(
-                [[1,1,1,1,1,0],
-                 [1,1,1,1,1,1],
-                 [0,0,0,0,0,0],
-                 [0,0,0,0,0,0],
-                 [0,0,0,0,0,0],
-                 [0,0,0,0,0,0]]),
-            'x':np.array(
-                [[0,0,0,0,1,1],
-                 [1,1,1,0,0,0],
-                 [0,0,0,0,0,0],
-                 [0,0,0,0,0,0],
-                 [0,0,0,0,0,0],
-                 [0,0,0,0,0,0]]),
-            'dash':np.array(
-                [[0,0,0,0,0,0],
-                 [0,0,0,0,0,0],
-                 [0,0,0,0,0,0],
-                 [0,0,0,0,0,0],
-                 [0,0,0,0,1,1],
-                 [0,0,0,0,1,1]])
-            }
-            
-        shapecoords = np.transpose(np.nonzero(shapegrid[shape]))+np.array(pos,dtype='int32')
-
-        for coord in shapecoords:
-            self.put_obj(Floor(color), coord[0], coord[1])
+            self._place_agent()
         
         
 
 
 class SquareDonutEnv_16(Square_Donut_Env):
+    SHAPE_LOCS = ((1, 1), (9, 4), (2, 8), (8, 8),
+                  (4, 0), (5, 0), (6, 0), (7, 0),
+                  (2, 11), (3, 11), (4, 11), (5, 11))
+
     def __init__(self, **kwargs):
         super().__init__(size=16, agent_start_pos=None, **kwargs)
 
 class SquareDonutEnv_17(Square_Donut_Env):
+    SHAPE_LOCS = ((1, 1), (10, 4), (2, 9), (9, 9),
+                  (4, 0), (5, 0), (6, 0), (7, 0),
+                  (2, 11), (3, 11), (4, 11), (5, 11))
+
     def __init__(self, **kwargs):
         super().__init__(size=17, agent_start_pos=None, **kwargs)
 
 class SquareDonutEnv_18(Square_Donut_Env):
+    SHAPE_LOCS = ((2, 2), (11, 5), (3, 10), (10, 10),
+                  (5, 1), (6, 1), (7, 1), (8, 1),
+                  (3, 12), (4, 12), (5, 12), (6, 12))
+
     def __init__(self, **kwargs):
         super().__init__(size=18, agent_start_pos=None, **kwargs)
 
 class SquareDonutEnv_20(Square_Donut_Env):
+    SHAPE_LOCS = ((2, 2), (12, 5), (3, 11), (11, 11),
+                  (5, 1), (6, 1), (7, 1), (8, 1),
+                  (3, 12), (4, 12), (5, 12), (6, 12))
+
     def __init__(self, **kwargs):
         super().__init__(size=20, agent_start_pos=None, **kwargs)
\ No newline at end of file
@@ -1,13 +1,17 @@
 from __future__ import annotations
 
+from functools import lru_cache
+
 import numpy as np
 from gymnasium import spaces
 
 from minigrid.core.grid import Grid
 from minigrid.core.mission import MissionSpace
-from minigrid.core.world_object import Gates, Lava, Fake_Lava, Floor, FloorCustom, WallCustom
+from minigrid.core.world_object import Lava, Fake_Lava, FloorCustom, WallCustom
 from minigrid.minigrid_env import MiniGridEnv
-from minigrid.core.constants import PATTERNS, IDX_TO_COLOR
+from minigrid.core.constants import DIR_TO_VEC, PATTERNS, IDX_TO_COLOR
+from minigrid.envs.lavabase import LavaStepEnv
+from minigrid.envs.shapes import floor_tile, gate_tile, wall_tile
 
 patterns = [
     'lines',
@@ -20,13 +24,52 @@ patterns = [
 gen = np.random.default_rng(seed=42)
 wall_colors = gen.choice(100, (500,3))
 
+# Tinted wall in the top-left corner. It carries no state, so every
+# environment shares this one instance
+_CORNER_WALL = WallCustom(add=wall_colors[1])
+
+
+# Cell types that end the episode with a reward when the agent walks into them
+_REWARD_TYPES = frozenset({"goal", "fake_lava"})
+
+# (dx, dy) step of each agent direction, as plain ints
+_DIR_DELTAS = tuple((int(dx), int(dy)) for dx, dy in DIR_TO_VEC)
+
+# Codes of the cells the forward action reacts to, see FakeLavaEnv._cell_codes
+_CELL_OTHER, _CELL_REWARD, _CELL_LAVA = 0, 1, 2
+
+
+def _cell_code(cell) -> int:
+    cell_type = cell.type if cell is not None else None
+    if cell_type in _REWARD_TYPES:
+        return _CELL_REWARD
+    if cell_type == "lava":
+        return _CELL_LAVA
+    return _CELL_OTHER
+
+
+@lru_cache(maxsize=None)
+def _shuffled_marks(seed) -> np.ndarray:
+    """
+    Return the read-only mark permutation for `seed`, shared by all
+    environments built with it. A local generator keeps the global NumPy
+    random state untouched.
+    """
+    marks = np.random.default_rng(seed=seed).permutation(25)
+    marks.setflags(write=False)
+    return marks
+
+
 def reject_nonmarked_rooms(env: MiniGridEnv, pos: tuple[int, int]):
     """
     Function to filter out object positions that are not in the unique rooms
     """
     x, y = pos
-    marked = x <= env.roomsize or y <= env.roomsize or x>= (env.width - env.roomsize - 1) or y >= (env.height - env.roomsize - 1)
-    return (not marked)
+    roomsize = env.roomsize
+    return not (
+        x <= roomsize or y <= roomsize
+        or x >= env.width - roomsize - 1 or y >= env.height - roomsize - 1
+    )
 
 
 def reject_nontarget_rooms(env: MiniGridEnv, pos: tuple[int, int]):
@@ -39,7 +82,7 @@ def reject_nontarget_rooms(env: MiniGridEnv, pos: tuple[int, int]):
     return (not target)
 
 
-class FakeLavaEnv(MiniGridEnv):
+class FakeLavaEnv(LavaStepEnv):
 
     """
     ## Description
@@ -115,13 +158,13 @@ class FakeLavaEnv(MiniGridEnv):
         self.gates = gates
         self.neg = neg
 
+        # The gate stencil only depends on the room layout, so compute it once
+        self._gate_pos = self._gate_positions()
+
+        self.marks = _shuffled_marks(seed)
 
-        randgen = np.random.default_rng(seed=seed)
-        self.marks = np.arange(25)
-        randgen.shuffle(self.marks)
-        # np.random.seed(seed)
-        # self.marks = np.arange(25)
-        # np.random.shuffle(self.marks)
+        # Cells the agent may start from, listed when first needed
+        self._start_mask = None
 
         mission_space = MissionSpace(mission_func=self._gen_mission)
 
@@ -139,7 +182,47 @@ class FakeLavaEnv(MiniGridEnv):
         )
 
         self.action_space = spaces.Discrete(4)
+        self._index_cells()
+
+
+    def _wall_mask(self, width, height):
+        """
+        Return a (width, height) boolean mask of the room and outer walls
+        """
+        step = self.roomsize + 1
+        mask = np.zeros((width, height), dtype=bool)
 
+        # Walls of the inner rooms, which share their sides
+        if self.roomsh > 2 and self.roomsv > 2:
+            xs = np.arange(1, self.roomsh) * step
+            ys = np.arange(1, self.roomsv) * step
+            mask[xs, step:ys[-1]+1] = True
+            mask[step:xs[-1]+1, ys] = True
+
+        mask[[0, -1], :] = True
+        mask[:, [0, -1]] = True
+        return mask
+
+    def _gate_positions(self):
+        """
+        Return the (x, y) positions of the gates, three in the middle of
+        every side of the inner rooms
+        """
+        if self.roomsh <= 2 or self.roomsv <= 2:
+            return np.empty((0, 2), dtype=int)
+
+        step = self.roomsize + 1
+        spread = np.arange(-1, 2)
+        mids_x = (np.arange(1, self.roomsh-1) * step + self.halfsize)[:, None] + spread
+        mids_y = (np.arange(1, self.roomsv-1) * step + self.halfsize)[:, None] + spread
+
+        # Gates in the vertical walls, then in the horizontal walls
+        vert = np.meshgrid(np.arange(1, self.roomsh) * step, mids_y.ravel(), indexing='ij')
+        horz = np.meshgrid(mids_x.ravel(), np.arange(1, self.roomsv) * step, indexing='ij')
+        return np.concatenate([
+            np.stack(vert, axis=-1).reshape(-1, 2),
+            np.stack(horz, axis=-1).reshape(-1, 2),
+        ])
 
     @staticmethod
     def _gen_mission():
@@ -149,122 +232,56 @@ class FakeLavaEnv(MiniGridEnv):
         if regenerate:
             assert width >= 17 and height >= 13
 
-            # Create an empty grid
-            self.grid = Grid(width, height)
-
-            # Generate rooms
-            for i in range(self.roomsh-2):
-                for j in range(self.roomsv-2):
-                    self.grid.wall_rect(
-                                        (i+1)*(self.roomsize+1),
-                                        (j+1)*(self.roomsize+1),
-                                        self.roomsize+2,
-                                        self.roomsize+2,
-                                        # Gates
-                                        )
-            # for i in range(self.roomsh):
-            #     for j in range(self.roomsv):
-            #         self.grid.wall_rect(
-            #                             i*(self.roomsize+1),
-            #                             j*(self.roomsize+1),
-            #                             self.roomsize+2,
-            #                             self.roomsize+2,
-            #                             # Gates
-            #                             )
-
-            # Generate the surrounding walls
-            # self.grid.wall_rect(0, 0, width, height, WallCustom, wall_colors)
-            self.grid.wall_rect(0, 0, width, height)
-            self.grid.set(1,1,WallCustom(add=wall_colors[1]))
+            # Create an empty grid, reusing the previous episode's buffer
+            if self.grid.width == width and self.grid.height == height:
+                self.grid.clear()
+            else:
+                self.grid = Grid(width, height)
+
+            # Generate rooms and the surrounding walls
+            cells = self.grid.grid
+            wall = wall_tile()
+            for i in np.flatnonzero(self._wall_mask(width, height).T).tolist():
+                cells[i] = wall
+
+            self.grid.set(1,1,_CORNER_WALL)
 
             # Generate gates
             if self.gates:
-                for i in range(self.roomsh-2):
-                    for j in range(self.roomsv-2):
-                        self.grid.set((i+1)*(self.roomsize+1), (j+1)*(self.roomsize+1)+self.halfsize-1, Gates())
-                        self.grid.set((i+1)*(self.roomsize+1), (j+1)*(self.roomsize+1)+self.halfsize, Gates())
-                        self.grid.set((i+1)*(self.roomsize+1), (j+1)*(self.roomsize+1)+self.halfsize+1, Gates())
-                        self.grid.set((i+2)*(self.roomsize+1), (j+1)*(self.roomsize+1)+self.halfsize-1, Gates())
-                        self.grid.set((i+2)*(self.roomsize+1), (j+1)*(self.roomsize+1)+self.halfsize, Gates())
-                        self.grid.set((i+2)*(self.roomsize+1), (j+1)*(self.roomsize+1)+self.halfsize+1, Gates())
-                        self.grid.set((i+1)*(self.roomsize+1)+self.halfsize-1, (j+1)*(self.roomsize+1), Gates())
-                        self.grid.set((i+1)*(self.roomsize+1)+self.halfsize, (j+1)*(self.roomsize+1), Gates())
-                        self.grid.set((i+1)*(self.roomsize+1)+self.halfsize+1, (j+1)*(self.roomsize+1), Gates())
-                        self.grid.set((i+1)*(self.roomsize+1)+self.halfsize-1, (j+2)*(self.roomsize+1), Gates())
-                        self.grid.set((i+1)*(self.roomsize+1)+self.halfsize, (j+2)*(self.roomsize+1), Gates())
-                        self.grid.set((i+1)*(self.roomsize+1)+self.halfsize+1, (j+2)*(self.roomsize+1), Gates())
-            # for i in range(self.roomsh-1):
-            #     self.grid.set((i+1)*(self.roomsize+1), height-self.halfsize, Gates())
-            #     self.grid.set((i+1)*(self.roomsize+1), height-self.halfsize-1, Gates())
-            #     self.grid.set((i+1)*(self.roomsize+1), height-self.halfsize-2, Gates())
-            #     for j in range(self.roomsv-1):
-            #         self.grid.set((i+1)*(self.roomsize+1), (j+1)*(self.roomsize+1)-self.halfsize-1, Gates())
-            #         self.grid.set((i+1)*(self.roomsize+1), (j+1)*(self.roomsize+1)-self.halfsize, Gates())
-            #         self.grid.set((i+1)*(self.roomsize+1), (j+1)*(self.roomsize+1)-self.halfsize+1, Gates())
-            #         self.grid.set((i+1)*(self.roomsize+1)-self.halfsize-1, (j+1)*(self.roomsize+1), Gates())
-            #         self.grid.set((i+1)*(self.roomsize+1)-self.halfsize, (j+1)*(self.roomsize+1), Gates())
-            #         self.grid.set((i+1)*(self.roomsize+1)-self.halfsize+1, (j+1)*(self.roomsize+1), Gates())
-            # for j in range(self.roomsv-1):
-            #     self.grid.set(width-self.halfsize, (j+1)*(self.roomsize+1), Gates())
-            #     self.grid.set(width-self.halfsize-1, (j+1)*(self.roomsize+1), Gates())
-            #     self.grid.set(width-self.halfsize-2, (j+1)*(self.roomsize+1), Gates())
+                self.grid.set_many(self._gate_pos[:, 0], self._gate_pos[:, 1], gate_tile())
 
             # Place lava
             if self.roomsv<5:
                 self.goalpos = None
+                step, half = self.roomsize + 1, self.halfsize
+                put_obj = self.put_obj
                 for i in range(self.roomsh-2):
                     for j in range(self.roomsv-2):
-                        pos = ((i+1)*(self.roomsize+1)+self.halfsize, (j+1)*(self.roomsize+1)+self.halfsize)
+                        pos = ((i+1)*step+half, (j+1)*step+half)
                         if not self.goalpos:
                             obj = Fake_Lava()
                             self.goalpos = pos
                         else:
                             obj = Lava()
-                        self.put_obj(obj, *pos)
+                        put_obj(obj, *pos)
 
             # Place the agent
-            if self.targetstart:
-                self.agent_pos = (-1, -1)
-                pos = self.place_obj(None, reject_fn=reject_nontarget_rooms)
-                self.agent_pos = pos
-                self.agent_dir = self._rand_int(0, 4)
-
-            else:
-                self.agent_pos = (-1, -1)
-                pos = self.place_obj(None, reject_fn=reject_nonmarked_rooms)
-                self.agent_pos = pos
-                self.agent_dir = self._rand_int(0, 4)
-
-            # Generate marks
-            for y in range(1,5):
-                self.put_obj(Floor('blue'), 1, y)
-            for y in range(1,6):
-                self.put_obj(Floor('blue'), 2, y)
-            for y in range(1,7):
-                self.put_obj(Floor('blue'), 3, y)
-            for y in range(self.height-5,self.height-2):
-                self.put_obj(Floor('yellow'), 2, y)
-            for y in range(self.height-10,self.height-6):
-                self.put_obj(Floor('yellow'), 3, y)
-            for x in range(self.width-self.roomsize-6,self.width-self.roomsize-1):
-                self.put_obj(Floor('yellow'), x, 1)
-            for x in range(self.width-self.roomsize-6,self.width-self.roomsize-1):
-                self.put_obj(Floor('yellow'), x, 2)
-            for x in range(self.width-self.roomsize-6,self.width-self.roomsize-1):
-                self.put_obj(Floor('yellow'), x, 3)
-            for x in range(self.width-4,self.width-1):
-                self.put_obj(Floor('red'), x, self.roomsize+2)
-            for x in range(self.width-4,self.width-1):
-                self.put_obj(Floor('red'), x, self.roomsize+3)
-            for x in range(self.width-self.roomsize-10,self.width-self.roomsize-5):
-                self.put_obj(Floor('red'), x, self.height-3)
-            for x in range(self.width-self.roomsize-10,self.width-self.roomsize-5):
-                self.put_obj(Floor('red'), x, self.height-4)
-            for x in range(self.width-self.roomsize-10,self.width-self.roomsize-5):
-                self.put_obj(Floor('red'), x, self.height-5)
-            for x in range(self.width-5,self.width-2):
-                for y in range(self.height-5,self.height-2):
-                    self.put_obj(Floor('blue'), x, y)
+            self._start_mask = None
+            self._place_agent()
+
+            # Generate marks, using the shared floor tiles
+            blue, yellow, red = floor_tile('blue'), floor_tile('yellow'), floor_tile('red')
+            rs = self.roomsize
+            fill_rect = self.grid.fill_rect
+            fill_rect(1, 1, 1, 4, blue)
+            fill_rect(2, 1, 1, 5, blue)
+            fill_rect(3, 1, 1, 6, blue)
+            fill_rect(2, height-5, 1, 3, yellow)
+            fill_rect(3, height-10, 1, 4, yellow)
+            fill_rect(width-rs-6, 1, 5, 3, yellow)
+            fill_rect(width-4, rs+2, 3, 2, red)
+            fill_rect(width-rs-10, height-5, 5, 3, red)
+            fill_rect(width-5, height-5, 3, 3, blue)
                 
             # n=0
             # for i in range(self.roomsh):
@@ -322,85 +339,88 @@ class FakeLavaEnv(MiniGridEnv):
                 "avoid the real lava and get to the fake lava square"
             )
             self.regenerate=False
-        else:
 
+            self._index_cells()
+            # The marks now cover some of the cells the agent started from
+            self._start_mask = None
+        else:
             # Place the agent
-            if self.targetstart:
-                self.agent_pos = (-1, -1)
-                pos = self.place_obj(None, reject_fn=reject_nontarget_rooms)
-                self.agent_pos = pos
-                self.agent_dir = self._rand_int(0, 4)
-
-            else:
-                self.agent_pos = (-1, -1)
-                pos = self.place_obj(None, reject_fn=reject_nonmarked_rooms)
-                self.agent_pos = pos
-                self.agent_dir = self._rand_int(0, 4)
+            self._place_agent()
 
     
-    def step(self, action):
-        
-        self.step_count += 1
-
-        reward = 0
-        terminated = False
-        truncated = False
-
-        # Get the position in front of the agent
-        fwd_pos = self.front_pos
-
-        # Get the contents of the cell in front of the agent
-        fwd_cell = self.grid.get(*fwd_pos)
-
-        # Rotate left
-        if action == self.actions.left:
-            self.agent_dir -= 1
-            if self.agent_dir < 0:
-                self.agent_dir += 4
-
-        # Rotate right
-        elif action == self.actions.right:
-            self.agent_dir = (self.agent_dir + 1) % 4
-
-        # Move forward
-        elif action == self.actions.forward:
-            if fwd_cell is None or fwd_cell.can_overlap():
-                self.agent_pos = tuple(fwd_pos)
-            if fwd_cell is not None and (fwd_cell.type == "goal" or fwd_cell.type == "fake_lava"):
-                terminated = True
-                reward = self._reward()
-            if fwd_cell is not None and fwd_cell.type == "lava":
-                reward = -self.neg #* self._reward()
-                terminated = True
-            # Move forward again if it's a Gates
-            # if fwd_cell is Gates:
-            #     fwd_pos = self.front_pos
-            #     self.agent_pos = tuple(fwd_pos)
-
-
-        # Pass
-        elif action == self.actions.pickup:
-            pass
-
+    def _index_cells(self):
+        """
+        Snapshot the grid cells along with their integer codes and whether
+        each can be entered, for the forward action
+        """
+        cells = self.grid.grid
+        self._indexed_cells = list(cells)
+        self._cell_codes = [_cell_code(cell) for cell in cells]
+        self._cell_overlap = [cell is None or cell.can_overlap() for cell in cells]
+
+    def _place_agent(self):
+        # The start cells only change when the grid is rebuilt, so they are
+        # marked once in a flat mask. Positions are still drawn as in
+        # place_obj, an x then a y per try, so seeded starts are unchanged.
+        if self._start_mask is None:
+            if self.targetstart:
+                reject_fn = reject_nontarget_rooms
+            else:
+                reject_fn = reject_nonmarked_rooms
+            width = self.grid.width
+            self._start_mask = [
+                cell is None and not reject_fn(self, (i % width, i // width))
+                for i, cell in enumerate(self.grid.grid)
+            ]
+            if not any(self._start_mask):
+                raise RecursionError("no free cell to place the agent on")
+
+        width, height = self.grid.width, self.grid.height
+        start_mask = self._start_mask
+        while True:
+            x = self._rand_int(0, width)
+            y = self._rand_int(0, height)
+            if start_mask[y * width + x]:
+                break
+        self.agent_pos = (x, y)
+        self.agent_dir = self._rand_int(0, 4)
+
+    def _forward(self):
+        # Get the position in front of the agent, in plain ints rather than
+        # through the ndarray math of front_pos
+        dx, dy = _DIR_DELTAS[self.agent_dir]
+        x, y = self.agent_pos
+        x, y = int(x) + dx, int(y) + dy
+
+        # Look up the cell in front of the agent in the precomputed tables,
+        # unless it was replaced since they were built, e.g. by grid.set
+        idx = y * self.width + x
+        cell = self.grid.grid[idx]
+        if cell is self._indexed_cells[idx]:
+            can_overlap, code = self._cell_overlap[idx], self._cell_codes[idx]
         else:
-            raise ValueError(f"Unknown action: {action}")
-
-        if self.step_count >= self.max_steps:
-            truncated = True
-
-        if self.render_mode == "human":
-            self.render()
+            can_overlap, code = cell is None or cell.can_overlap(), _cell_code(cell)
+
+        if can_overlap:
+            self.agent_pos = (x, y)
+        if code == _CELL_REWARD:
+            return self._reward(), True
+        if code == _CELL_LAVA:
+            return -self.neg, True #* self._reward()
+        # Move forward again if it's a Gates
+        # if fwd_cell is Gates:
+        #     fwd_pos = self.front_pos
+        #     self.agent_pos = tuple(fwd_pos)
+        return 0, False
 
-        obs = self.gen_obs()
-
-        return obs, reward, terminated, truncated, {}
-    
     def place_shape(self,shape,pos,color):
         """
         Place a shape with upper left corner at (x,y)
         """
-            
-        shapecoords = np.transpose(np.nonzero(shape))+np.array(pos,dtype='int32')
+        px, py = int(pos[0]), int(pos[1])
 
-        for coord in shapecoords:
-            self.put_obj(Floor(color), coord[0], coord[1])
\ No newline at end of file
+        # Write the shared tile straight into the grid
+        tile = floor_tile(color)
+        grid_set = self.grid.set
+        for dx, dy in np.argwhere(shape).tolist():
+            grid_set(px + dx, py + dy, tile)
\ No newline at end of file
@@ -2,13 +2,96 @@ from __future__ import annotations
 
 from minigrid.core.grid import Grid
 from minigrid.core.mission import MissionSpace
-from minigrid.core.world_object import Goal, Goal_invisible, Floor, Wall
+from minigrid.core.world_object import Goal, Goal_invisible, Wall
 from minigrid.minigrid_env import MiniGridEnv
+from minigrid.envs.shapes import floor_tile
 import numpy as np
 
 from gymnasium import spaces
 
 
+# 8x8 shapes drawn by FourRoomsEnv.place_shape
+_SHAPE_GRIDS = {
+    'vert':np.array(
+        [[1,0,1,0,1,0,1,0],
+         [1,0,1,0,1,0,1,0],
+         [0,0,0,0,0,0,0,0],
+         [0,0,0,0,0,0,0,0],
+         [0,0,0,0,0,0,0,0],
+         [0,0,0,0,0,0,0,0],
+         [1,0,1,0,1,0,1,0],
+         [1,0,1,0,1,0,1,0]]),
+    'horiz':np.array(
+        [[0,0,1,1,1,1,0,0],
+         [0,0,0,0,0,0,0,0],
+         [0,0,1,1,1,1,0,0],
+         [0,0,0,0,0,0,0,0],
+         [0,0,1,1,1,1,0,0],
+         [0,0,0,0,0,0,0,0],
+         [0,0,1,1,1,1,0,0],
+         [0,0,0,0,0,0,0,0]]),
+    'fwdslash':np.array(
+        [[1,0,0,0,1,0,0,0],
+         [0,1,0,1,0,0,0,1],
+         [0,0,1,0,0,0,1,0],
+         [0,1,0,1,0,1,0,0],
+         [1,0,0,0,1,0,0,0],
+         [0,0,0,1,0,1,0,1],
+         [0,0,1,0,0,0,1,0],
+         [0,1,0,0,0,1,0,1]]),
+    'bckslash':np.array(
+        [[0,0,0,1,0,0,0,1],
+         [1,0,0,0,1,0,0,0],
+         [0,1,0,0,0,1,0,0],
+         [0,0,1,0,0,0,1,0],
+         [0,0,0,1,0,0,0,1],
+         [1,0,0,0,1,0,0,0],
+         [0,1,0,0,0,1,0,0],
+         [0,0,1,0,0,0,1,0]])
+}
+
+# Base 4x4 shape definitions for FourRoomsObjs.place_shape
+_BASE_SHAPES = {
+    'triangleLright': np.array([
+        [0,0,0,1],
+        [0,0,1,1],
+        [0,1,1,1],
+        [1,1,1,1]]),
+    'triangleUleft': np.array([
+        [1,0,0,0],
+        [1,1,0,0],
+        [1,1,1,0],
+        [1,1,1,1]]),
+    'triangleUright': np.array([
+        [1,1,1,1],
+        [0,1,1,1],
+        [0,0,1,1],
+        [0,0,0,1]]),
+    'plus': np.array([
+        [0,1,0],
+        [1,1,1],
+        [0,1,0]]),
+    'x':np.array(
+        [[1,1,0,1,1],
+         [0,1,1,1,0],
+         [0,1,1,1,0],
+         [1,1,0,1,1],]),
+    'L': np.array(
+        [[0,1],
+         [1,1],]),
+}
+
+for _shape in (*_SHAPE_GRIDS.values(), *_BASE_SHAPES.values()):
+    _shape.flags.writeable = False
+del _shape
+
+# (x, y) offsets of the tiles of each 8x8 shape, computed once at import
+_SHAPE_OFFSETS = {name: np.argwhere(grid).tolist() for name, grid in _SHAPE_GRIDS.items()}
+
+# (x, y) offsets of the scaled base shapes, keyed by (shape, scale)
+_scaled_offsets_cache: dict[tuple[str, float], list[list[int]]] = {}
+
+
 class FourRoomsEnv(MiniGridEnv):
 
     """
@@ -91,16 +174,11 @@ class FourRoomsEnv(MiniGridEnv):
     
     def _is_pos_valid(self, pos: tuple[int, int]) -> bool:
         """Check if a position is valid (not a wall)"""
-        x, y = pos
-        obj = self.grid.get(x, y)
-       
+        obj = self.grid.get(*pos)
+
         # Valid: empty cells (None) or overlappable objects (Floor)
         # Invalid: walls (can_overlap() returns False)
-        is_valid = obj is None or obj.can_overlap()
-        if not is_valid:
-            print(f"Position {pos} is invalid (object: {obj})")
-
-        return is_valid
+        return obj is None or obj.can_overlap()
 
     def _validate_and_set_pos(self, pos: tuple[int, int]) -> tuple[int, int] | None:
         new_pos = pos
@@ -217,49 +295,11 @@ class FourRoomsEnv(MiniGridEnv):
         """
         Place a 8x8 shape with lower left corner at (x,y)
         """
-        shapegrid={
-            'vert':np.array(
-                [[1,0,1,0,1,0,1,0],
-                 [1,0,1,0,1,0,1,0],
-                 [0,0,0,0,0,0,0,0],
-                 [0,0,0,0,0,0,0,0],
-                 [0,0,0,0,0,0,0,0],
-                 [0,0,0,0,0,0,0,0],
-                 [1,0,1,0,1,0,1,0],
-                 [1,0,1,0,1,0,1,0]]),
-            'horiz':np.array(
-                [[0,0,1,1,1,1,0,0],
-                 [0,0,0,0,0,0,0,0],
-                 [0,0,1,1,1,1,0,0],
-                 [0,0,0,0,0,0,0,0],
-                 [0,0,1,1,1,1,0,0],
-                 [0,0,0,0,0,0,0,0],
-                 [0,0,1,1,1,1,0,0],
-                 [0,0,0,0,0,0,0,0]]),
-            'fwdslash':np.array(
-                [[1,0,0,0,1,0,0,0],
-                 [0,1,0,1,0,0,0,1],
-                 [0,0,1,0,0,0,1,0],
-                 [0,1,0,1,0,1,0,0],
-                 [1,0,0,0,1,0,0,0],
-                 [0,0,0,1,0,1,0,1],
-                 [0,0,1,0,0,0,1,0],
-                 [0,1,0,0,0,1,0,1]]),
-            'bckslash':np.array(
-                [[0,0,0,1,0,0,0,1],
-                 [1,0,0,0,1,0,0,0],
-                 [0,1,0,0,0,1,0,0],
-                 [0,0,1,0,0,0,1,0],
-                 [0,0,0,1,0,0,0,1],
-                 [1,0,0,0,1,0,0,0],
-                 [0,1,0,0,0,1,0,0],
-                 [0,0,1,0,0,0,1,0]])
-            }
-            
-        shapecoords = np.transpose(np.nonzero(shapegrid[shape]))+np.array(pos,dtype='int32')
-
-        for coord in shapecoords:
-            self.put_obj(Floor(color), coord[0], coord[1])
+        x, y = pos
+        tile = floor_tile(color)
+        grid_set = self.grid.set
+        for dx, dy in _SHAPE_OFFSETS[shape]:
+            grid_set(x + dx, y + dy, tile)
 
 
 class FourRoomsObjs(FourRoomsEnv):
@@ -334,60 +374,36 @@ class FourRoomsObjs(FourRoomsEnv):
 
     def place_shape(self, shape, pos, color, scale=1.0):
         """Place a scaled shape at position"""
-        # Base 4x4 shape definitions
-        base_shapes = {
-            'triangleLright': np.array([
-                [0,0,0,1],
-                [0,0,1,1],
-                [0,1,1,1],
-                [1,1,1,1]]),
-            'triangleUleft': np.array([
-                [1,0,0,0],
-                [1,1,0,0],
-                [1,1,1,0],
-                [1,1,1,1]]),
-            'triangleUright': np.array([
-                [1,1,1,1],
-                [0,1,1,1],
-                [0,0,1,1],
-                [0,0,0,1]]),
-            'plus': np.array([
-                [0,1,0],
-                [1,1,1],
-                [0,1,0]]),
-            'x':np.array(
-                [[1,1,0,1,1],
-                 [0,1,1,1,0],
-                 [0,1,1,1,0],
-                 [1,1,0,1,1],]),
-            'L': np.array(
-                [[0,1],
-                 [1,1],]),
-        }
+        # Get the offsets of the scaled shape, scaling it on first use
+        offsets = _scaled_offsets_cache.get((shape, scale))
+        if offsets is None:
+            base = _BASE_SHAPES.get(shape)
+            if base is None:
+                return  # Unknown shape
 
-        # Get and scale shape
-        base = base_shapes.get(shape)
-        if base is None:
-            return  # Unknown shape
+            offsets = _scaled_offsets_cache[shape, scale] = self._scaled_offsets(base, scale)
 
-        shaped = self._scale_shape(base, scale)
-
-        # Place Floor objects at shape coordinates
-        shapecoords = np.transpose(np.nonzero(shaped)) + np.array(pos, dtype='int32')
-        for coord in shapecoords:
-            self.put_obj(Floor(color), coord[0], coord[1])
+        # Write the shared floor tile at the shape coordinates
+        x, y = pos
+        tile = floor_tile(color)
+        grid_set = self.grid.set
+        for dx, dy in offsets:
+            grid_set(x + dx, y + dy, tile)
 
-    def _scale_shape(self, base_shape, scale_factor):
-        """Scale shape by factor (0.5, 1.0, 2.0)"""
+    def _scaled_offsets(self, base_shape, scale_factor):
+        """Tile offsets of a shape scaled by factor (0.5, 1.0, 2.0)"""
         assert scale_factor in [0.5, 1.0, 2.0], f"Unsupported scale: {scale_factor}"
 
         if scale_factor == 1.0:
-            return base_shape
+            return np.argwhere(base_shape).tolist()
         elif scale_factor < 1.0:
             # Downscale by selecting every nth element
             step = int(1.0 / scale_factor)
-            return base_shape[::step, ::step]
+            return np.argwhere(base_shape[::step, ::step]).tolist()
         else:
-            # Upscale by repeating elements
+            # Upscale by expanding each tile into a factor x factor block,
+            # without building the upscaled shape
             factor = int(scale_factor)
-            return np.repeat(np.repeat(base_shape, factor, axis=0), factor, axis=1)
+            block = np.argwhere(np.ones((factor, factor), dtype=bool))
+            coords = np.argwhere(base_shape)[:, None, :] * factor + block
+            return coords.reshape(-1, 2).tolist()
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import numpy as np
+from gymnasium import spaces
+
+from minigrid.core.constants import COLOR_TO_IDX
+from minigrid.core.grid import Grid
+from minigrid.core.mission import MissionSpace
+from minigrid.core.world_object import Fake_Lava, Lava
+from minigrid.envs.shapes import SHAPE_TENSOR_DONUT, gate_tile, stamp_shapes, wall_tile
+from minigrid.minigrid_env import MiniGridEnv
+
+
+# Shape drawn for each letter of `order`, and the color attribute it uses
+_SHAPE_META = {
+    'T': ('triangle', 'tri_color'),
+    'P': ('plus', 'plus_color'),
+    'X': ('x', 'x_color'),
+    'D': ('dash', 'tri_color'),
+}
+
+# Cells and start masks of the built lava donut layouts, keyed by the
+# configuration they depend on
+_layout_cache: dict[tuple, tuple[list, np.ndarray]] = {}
+
+# Cell types that end the episode when the agent walks into them
+_TERMINAL_TYPES = frozenset({"goal", "fake_lava", "lava"})
+
+
+def reject_lava_rooms(env, pos):
+    """
+    Function to filter out object positions that are in the lava rooms
+    """
+    x, y = pos
+    return not env._valid_mask[x, y]
+
+
+class LavaStepEnv(MiniGridEnv):
+    """
+    Environment with only the left, right and forward actions, each run by
+    its own handler. Subclasses provide `_forward`.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Handlers indexed by action: left, right, forward and pickup (unused)
+        cls._ACTION_HANDLERS = (cls._turn_left, cls._turn_right, cls._forward, cls._pass)
+
+    def _turn_left(self):
+        self.agent_dir = (self.agent_dir - 1) & 3
+        return 0, False
+
+    def _turn_right(self):
+        self.agent_dir = (self.agent_dir + 1) & 3
+        return 0, False
+
+    def _forward(self):
+        raise NotImplementedError
+
+    def _pass(self):
+        return 0, False
+
+    def step(self, action):
+
+        self.step_count += 1
+
+        truncated = False
+
+        if not 0 <= action < len(self._ACTION_HANDLERS):
+            raise ValueError(f"Unknown action: {action}")
+        reward, terminated = self._ACTION_HANDLERS[action](self)
+
+        if self.step_count >= self.max_steps:
+            truncated = True
+
+        if self.render_mode == "human":
+            self.render()
+
+        obs = self.gen_step_obs(terminated)
+
+        return obs, reward, terminated, truncated, {}
+
+
+class LavaDonutBase(LavaStepEnv):
+    """
+    Donut of shapes around two walled rooms, one holding fake lava and the
+    other real lava. Subclasses provide the geometry: the shape locations,
+    the room walls, the gates, the lava positions and the start mask.
+    """
+
+    def __init__(
+        self,
+        width,
+        height,
+        agent_start_pos=None,
+        agent_start_dir=None,
+        tri_color='blue',
+        plus_color='red',
+        x_color='yellow',
+        order='TPXD',
+        neg=0,
+        max_steps=200,
+        **kwargs
+    ):
+        self.agent_start_pos = agent_start_pos
+        self.agent_start_dir = agent_start_dir
+
+        self.tri_color = tri_color
+        self.plus_color = plus_color
+        self.x_color = x_color
+        self.shuffle_indices = [0, 1, 2]
+        self.order = order
+        self.neg = neg
+
+        mission_space = MissionSpace(mission_func=self._gen_mission)
+
+        super().__init__(
+            mission_space=mission_space,
+            width=width,
+            height=height,
+            max_steps=max_steps,
+            **kwargs
+        )
+
+        self.action_space = spaces.Discrete(4)
+        self._layout_key = None
+
+    def _shape_locs(self, width, height):
+        """
+        Return the shape positions: the four slots filled according to
+        `order`, then four bars along the top and four along the bottom
+        """
+        raise NotImplementedError
+
+    def _draw_rooms(self, grid, width, height):
+        """
+        Draw the walls of the lava rooms into `grid`
+        """
+        raise NotImplementedError
+
+    def _gate_coords(self, width, height):
+        """
+        Return the (x, y) positions of the gates into the lava rooms
+        """
+        raise NotImplementedError
+
+    def _lava_positions(self, width, height):
+        """
+        Return the positions of the fake lava and of the real lava
+        """
+        raise NotImplementedError
+
+    def _valid_agent_mask(self, width, height):
+        """
+        Return a (width, height) boolean mask of the cells outside the lava rooms
+        """
+        raise NotImplementedError
+
+    def _geometry_key(self):
+        """
+        Return the attributes other than the size that the geometry depends on
+        """
+        return ()
+
+    def _wall_indices(self, width, height):
+        """
+        Return the flat indices of the outer walls and of the central rooms
+        """
+        grid = Grid(width, height)
+        grid.wall_rect(0, 0, width, height)
+        outer = np.flatnonzero([cell is not None for cell in grid.grid])
+
+        grid = Grid(width, height)
+        self._draw_rooms(grid, width, height)
+        rooms = np.flatnonzero([cell is not None for cell in grid.grid])
+        return outer, rooms
+
+    @staticmethod
+    def _gen_mission():
+        return "avoid the real lava and get to the fake lava square"
+
+    def _gen_grid(self, width, height, regenerate=True):
+        if regenerate:
+            # Only the agent moves between episodes, so the walls, shapes and
+            # lava are built once and copied into the grid on every reset
+            layout_key = (type(self), width, height, self._geometry_key(), self.order, self.tri_color, self.plus_color, self.x_color)
+            if self._layout_key != layout_key:
+                # Environments with the same configuration, e.g. the workers
+                # of a vector env, share one built layout
+                layout = _layout_cache.get(layout_key)
+                if layout is None:
+                    self._build_layout(width, height)
+                    layout = (self._layout_cells, self._valid_mask)
+                    _layout_cache[layout_key] = layout
+                self._layout_cells, self._valid_mask = layout
+                self._layout_key = layout_key
+
+            if self.grid.width != width or self.grid.height != height:
+                self.grid = Grid(width, height)
+            self.grid.grid[:] = self._layout_cells
+
+        # Place the agent
+        self._place_agent()
+
+    def _build_layout(self, width, height):
+        """
+        Build the static walls, shapes and lava and keep a copy of the cells,
+        along with the mask of the cells where the agent may start
+        """
+        # Everything is derived from the current configuration, so a cached
+        # layout always matches its key
+        wall_flat_idx, room_wall_flat_idx = self._wall_indices(width, height)
+        self._valid_mask = self._valid_agent_mask(width, height)
+
+        # Create an empty grid
+        self.grid = Grid(width, height)
+
+        # Generate the surrounding walls
+        # Consider: walls at -1, rather than 0
+        cells = self.grid.grid
+        wall = wall_tile()
+        for i in wall_flat_idx.tolist():
+            cells[i] = wall
+
+        loc = self._shape_locs(width, height)
+
+        # The ordered shapes, then the bars on the bottom and top of the map,
+        # all written in one pass
+        stamps = [
+            (shape, pos, COLOR_TO_IDX[getattr(self, color_attr)])
+            for (shape, color_attr), pos in zip((_SHAPE_META[char] for char in self.order), loc)
+        ]
+        x_color_id, plus_color_id = COLOR_TO_IDX[self.x_color], COLOR_TO_IDX[self.plus_color]
+        stamps += [('plus', pos, x_color_id) for pos in loc[4:8]]
+        stamps += [('plus', pos, plus_color_id) for pos in loc[8:]]
+        stamp_shapes(self.grid, SHAPE_TENSOR_DONUT, stamps)
+
+        # Adding the central rooms
+        for i in room_wall_flat_idx.tolist():
+            cells[i] = wall
+
+        gate_coords = np.array(self._gate_coords(width, height))
+        self.grid.set_many(gate_coords[:, 0], gate_coords[:, 1], gate_tile())
+
+        # Place lava
+        fake_pos, lava_pos = self._lava_positions(width, height)
+        self.put_obj(Fake_Lava(), *fake_pos)
+        self.put_obj(Lava(), *lava_pos)
+
+        self._layout_cells = list(self.grid.grid)
+
+    def _place_agent(self):
+        if self.agent_start_pos is not None:
+            self.agent_pos = self.agent_start_pos
+            self.agent_dir = self.agent_start_dir
+        else:
+            self.agent_pos = (-1, -1)
+            self.agent_pos = self.place_obj(None, reject_fn=reject_lava_rooms)
+            self.agent_dir = self._rand_int(0, 4)
+
+    def _forward(self):
+        # Get the position in front of the agent
+        fwd_pos = self.front_pos
+
+        # Get the contents of the cell in front of the agent
+        fwd_cell = self.grid.get(*fwd_pos)
+
+        if fwd_cell is None:
+            self.agent_pos = tuple(fwd_pos)
+            return 0, False
+        if fwd_cell.can_overlap():
+            self.agent_pos = tuple(fwd_pos)
+        if fwd_cell.type in _TERMINAL_TYPES:
+            if fwd_cell.type == "lava":
+                return -self.neg, True  # * self._reward()
+            return self._reward(), True
+        # Move forward again if it's a Gates
+        # if fwd_cell is Gates:
+        #     fwd_pos = self.front_pos
+        #     self.agent_pos = tuple(fwd_pos)
+        return 0, False
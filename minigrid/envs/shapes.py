@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from minigrid.core.constants import COLOR_TO_IDX, IDX_TO_COLOR
+from minigrid.core.world_object import Floor, Gates, Wall
+
+if TYPE_CHECKING:
+    from minigrid.core.grid import Grid
+
+# 6x6 shape bitmaps stamped as colored floor tiles. The first array axis is
+# the x offset and the second axis the y offset of a tile.
+SHAPE_GRIDS_FULL = {
+    'plus':np.array(
+        [[0,0,1,1,0,0],
+         [0,0,1,1,0,0],
+         [1,1,1,1,1,1],
+         [1,1,1,1,1,1],
+         [0,0,1,1,0,0],
+         [0,0,1,1,0,0]]),
+    'triangle':np.array(
+        [[1,0,0,0,0,0],
+         [1,1,0,0,0,0],
+         [1,1,1,0,0,0],
+         [1,1,1,1,0,0],
+         [1,1,1,1,1,0],
+         [1,1,1,1,1,1]]),
+    'x':np.array(
+        [[1,1,0,0,1,1],
+         [1,1,1,1,1,1],
+         [0,1,1,1,1,0],
+         [0,1,1,1,1,0],
+         [1,1,1,1,1,1],
+         [1,1,0,0,1,1]]),
+}
+
+# Sparse variants used by the donut environments
+SHAPE_GRIDS_DONUT = {
+    'plus':np.array(
+        [[0,0,0,0,0,0],
+         [0,0,0,0,0,0],
+         [0,0,0,0,0,0],
+         [0,0,0,0,0,0],
+         [0,0,0,0,0,0],
+         [0,0,1,1,0,0]]),
+    'triangle':np.array(
+        [[1,1,1,1,1,0],
+         [1,1,1,1,1,1],
+         [0,0,0,0,0,0],
+         [0,0,0,0,0,0],
+         [0,0,0,0,0,0],
+         [0,0,0,0,0,0]]),
+    'x':np.array(
+        [[0,0,0,0,1,1],
+         [1,1,1,0,0,0],
+         [0,0,0,0,0,0],
+         [0,0,0,0,0,0],
+         [0,0,0,0,0,0],
+         [0,0,0,0,0,0]]),
+    'dash':np.array(
+        [[0,0,0,0,0,0],
+         [0,0,0,0,0,0],
+         [0,0,0,0,0,0],
+         [0,0,0,0,0,0],
+         [0,0,0,0,1,1],
+         [0,0,0,0,1,1]]),
+}
+
+# Contiguous (shape, x, y) tensors of the bitmaps above, indexed through
+# SHAPE_IDX. LEnv has no dash, so that slot is left empty in the full set.
+SHAPE_NAMES = ('plus', 'triangle', 'x', 'dash')
+SHAPE_IDX = {name: i for i, name in enumerate(SHAPE_NAMES)}
+SHAPE_TENSOR_FULL = np.stack(
+    [SHAPE_GRIDS_FULL.get(name, np.zeros((6, 6))) for name in SHAPE_NAMES]
+).astype(np.int8)
+SHAPE_TENSOR_DONUT = np.stack(
+    [SHAPE_GRIDS_DONUT[name] for name in SHAPE_NAMES]
+).astype(np.int8)
+
+# Floor, wall and gate tiles carry no state of their own, so a single
+# instance of each is shared by every cell and every environment. FLOOR_TILES
+# is indexed by COLOR_TO_IDX so that callers can carry small integer color ids.
+FLOOR_TILES = tuple(Floor(IDX_TO_COLOR[idx]) for idx in range(len(IDX_TO_COLOR)))
+_FLOORS = {color: FLOOR_TILES[idx] for color, idx in COLOR_TO_IDX.items()}
+_WALL = Wall()
+_GATE = Gates()
+
+
+def floor_tile(color: str) -> Floor:
+    """Return the shared floor tile of the given color"""
+    return _FLOORS[color]
+
+
+def wall_tile() -> Wall:
+    """Return the shared wall tile"""
+    return _WALL
+
+
+def gate_tile() -> Gates:
+    """Return the shared gate tile"""
+    return _GATE
+
+
+def stamp_shapes(grid: Grid, shape_tensor: np.ndarray, stamps):
+    """
+    Write several shapes into the grid in a single NumPy pass
+
+    `stamps` is a sequence of (shape name, (x, y) position, color id)
+    triples. Where shapes overlap, later stamps overwrite earlier ones.
+    """
+    shape_ids = [SHAPE_IDX[name] for name, _, _ in stamps]
+    positions = np.array([pos for _, pos, _ in stamps], dtype=np.int32)
+
+    # Tiles come out ordered by stamp, so later stamps are written last
+    stamp, dx, dy = np.nonzero(shape_tensor[shape_ids])
+    xs = positions[stamp, 0] + dx
+    ys = positions[stamp, 1] + dy
+    flat_idx = (ys * grid.width + xs).tolist()
+
+    color_ids = np.array([color_id for _, _, color_id in stamps], dtype=np.uint8)
+    cells = grid.grid
+    for idx, color_id in zip(flat_idx, color_ids[stamp].tolist()):
+        cells[idx] = FLOOR_TILES[color_id]
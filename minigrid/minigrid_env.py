@@ -58,6 +58,7 @@ class MiniGridEnv(gym.Env):
         highlight: bool = True,
         tile_size: int = TILE_PIXELS,
         agent_pov: bool = False,
+        skip_terminal_obs: bool = False,
         **kwargs,
     ):
         # Initialize mission
@@ -128,6 +129,10 @@ class MiniGridEnv(gym.Env):
         self.agent_pov = agent_pov
         self.regenerate=True
 
+        # Return a blank view instead of rendering one on terminating steps
+        self.skip_terminal_obs = skip_terminal_obs
+        self._blank_image = None
+
     def reset(self, *, seed=None, options=None, regenerate=True):
         super().reset(seed=seed)
 
@@ -588,7 +593,7 @@ class MiniGridEnv(gym.Env):
         if self.render_mode == "human":
             self.render()
 
-        obs = self.gen_obs()
+        obs = self.gen_step_obs(terminated)
 
         return obs, reward, terminated, truncated, {}
 
@@ -647,6 +652,23 @@ class MiniGridEnv(gym.Env):
 
         return obs
 
+    def gen_step_obs(self, terminated):
+        """
+        Generate the observation returned by `step`.
+        With `skip_terminal_obs`, a terminating step gets an all-zero image
+        instead of the agent's view, since trainers usually discard it
+        """
+
+        if not (terminated and self.skip_terminal_obs):
+            return self.gen_obs()
+
+        if self._blank_image is None:
+            shape = (self.agent_view_size, self.agent_view_size, 3)
+            self._blank_image = np.zeros(shape, dtype="uint8")
+            self._blank_image.setflags(write=False)
+
+        return {"image": self._blank_image, "direction": self.agent_dir, "mission": self.mission}
+
     def get_pov_render(self, tile_size):
         """
         Render an agent's POV observation for visualization
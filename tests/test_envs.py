@@ -9,8 +9,15 @@ import pytest
 from gymnasium.envs.registration import EnvSpec
 from gymnasium.utils.env_checker import check_env, data_equivalence
 
+from minigrid.core.constants import COLOR_TO_IDX
 from minigrid.core.grid import Grid
 from minigrid.core.mission import MissionSpace
+from minigrid.core.world_object import Lava, Wall
+from minigrid.envs import shapes
+from minigrid.envs.Lroom import LEnv
+from minigrid.envs.donutLava import Lava_Donut_Env, LavaDonutEnv_16
+from minigrid.envs.donutLavaLong import Lava_Donut_Long_Env
+from minigrid.envs.fakelava import FakeLavaEnv
 from tests.utils import all_testing_env_specs, assert_equals
 
 CHECK_ENV_IGNORE_WARNINGS = [
@@ -303,3 +310,328 @@ def test_mission_space():
 
     assert mission_space.contains("get the green key and the green key.")
     assert mission_space.contains("go fetch the red ball and the green key.")
+
+
+def test_grid_fill_rect():
+    grid = Grid(6, 5)
+    wall = Wall()
+    grid.fill_rect(1, 2, 3, 2, wall)
+
+    for i in range(grid.width):
+        for j in range(grid.height):
+            expected = wall if 1 <= i < 4 and 2 <= j < 4 else None
+            assert grid.get(i, j) is expected
+
+
+def test_grid_walls():
+    grid = Grid(6, 5)
+    grid.horz_wall(1, 1, length=4)
+    grid.vert_wall(2, 2)
+
+    for i in range(grid.width):
+        for j in range(grid.height):
+            expected = (j == 1 and 1 <= i < 5) or (i == 2 and j >= 2)
+            assert isinstance(grid.get(i, j), Wall) == expected
+
+
+def test_grid_clear():
+    grid = Grid(6, 5)
+    cells = grid.grid
+    grid.fill_rect(0, 0, 6, 5, Wall())
+    grid.clear()
+
+    assert grid.grid is cells
+    assert cells == [None] * (6 * 5)
+
+
+@pytest.mark.parametrize("skip_terminal_obs", [True, False])
+def test_skip_terminal_obs(skip_terminal_obs):
+    env = gym.make("MiniGrid-DonutLava-16x16-v0", skip_terminal_obs=skip_terminal_obs)
+    env.reset(seed=0)
+
+    # Walk west into the real lava, which sits right of the fake lava room
+    env.unwrapped.agent_pos = (10, 8)
+    env.unwrapped.agent_dir = 2
+    assert env.unwrapped.grid.get(9, 8).type == "lava"
+
+    obs, _, terminated, _, _ = env.step(env.unwrapped.actions.forward)
+    assert terminated
+    assert obs["image"].shape == env.observation_space["image"].shape
+    assert obs["image"].any() != skip_terminal_obs
+
+    env.close()
+
+
+def test_lava_donut_layout_cache_per_class():
+    class NoLavaDonutEnv(LavaDonutEnv_16):
+        def _build_layout(self, width, height):
+            super()._build_layout(width, height)
+            self.grid.set(9, 8, None)
+            self._layout_cells = list(self.grid.grid)
+
+    LavaDonutEnv_16().reset(seed=0)
+    env = NoLavaDonutEnv()
+    env.reset(seed=0)
+    assert env.grid.get(9, 8) is None
+
+
+def test_grid_set_many():
+    rng = np.random.default_rng(0)
+    xs = rng.integers(0, 7, size=20)
+    ys = rng.integers(0, 5, size=20)
+    wall = Wall()
+
+    grid = Grid(7, 5)
+    grid.set_many(xs, ys, wall)
+
+    expected = Grid(7, 5)
+    for x, y in zip(xs.tolist(), ys.tolist()):
+        expected.set(x, y, wall)
+
+    assert grid.grid == expected.grid
+
+
+@pytest.mark.parametrize("tensor_name", ["SHAPE_TENSOR_FULL", "SHAPE_TENSOR_DONUT"])
+def test_stamp_shapes(tensor_name):
+
+    shape_tensor = getattr(shapes, tensor_name)
+    # Overlapping stamps, so later ones must win
+    stamps = [
+        ("triangle", (1, 1), COLOR_TO_IDX["blue"]),
+        ("plus", (3, 2), COLOR_TO_IDX["red"]),
+        ("x", (2, 4), COLOR_TO_IDX["yellow"]),
+        ("dash", (0, 6), COLOR_TO_IDX["green"]),
+    ]
+
+    grid = Grid(12, 12)
+    shapes.stamp_shapes(grid, shape_tensor, stamps)
+
+    expected = Grid(12, 12)
+    for name, (x, y), color_id in stamps:
+        for dx, dy in np.argwhere(shape_tensor[shapes.SHAPE_IDX[name]]).tolist():
+            expected.set(x + dx, y + dy, shapes.FLOOR_TILES[color_id])
+
+    assert grid.grid == expected.grid
+
+
+@pytest.mark.parametrize(
+    "roomsize, roomsv, roomsh", [(5, 3, 4), (4, 4, 5), (6, 3, 3), (5, 2, 4)]
+)
+def test_fakelava_walls_and_gates(roomsize, roomsv, roomsh):
+
+    env = FakeLavaEnv(roomsize=roomsize, roomsv=roomsv, roomsh=roomsh)
+    width, height = env.width, env.height
+    step = roomsize + 1
+    half = env.halfsize
+
+    # Walls and gates as they were drawn room by room
+    walls = Grid(width, height)
+    gates = set()
+    for i in range(roomsh - 2):
+        for j in range(roomsv - 2):
+            walls.wall_rect((i + 1) * step, (j + 1) * step, step + 1, step + 1)
+            for d in (-1, 0, 1):
+                gates.add(((i + 1) * step, (j + 1) * step + half + d))
+                gates.add(((i + 2) * step, (j + 1) * step + half + d))
+                gates.add(((i + 1) * step + half + d, (j + 1) * step))
+                gates.add(((i + 1) * step + half + d, (j + 2) * step))
+    walls.wall_rect(0, 0, width, height)
+
+    expected_mask = np.array(
+        [[walls.get(x, y) is not None for y in range(height)] for x in range(width)]
+    )
+    assert np.array_equal(env._wall_mask(width, height), expected_mask)
+
+    gate_pos = env._gate_positions()
+    assert len(gate_pos) == len(gates)
+    assert set(map(tuple, gate_pos.tolist())) == gates
+    env.close()
+
+
+def _direct_layout(env):
+    """Encode the layout of `env` built from scratch, bypassing the caches"""
+    env._build_layout(env.width, env.height)
+    grid = Grid(env.width, env.height)
+    grid.grid[:] = env._layout_cells
+    return grid.encode()
+
+
+@pytest.mark.parametrize(
+    "env_cls, sizes",
+    [
+        (Lava_Donut_Env, (16, 20)),
+        (LavaDonutEnv_16, (None, None)),
+        (Lava_Donut_Long_Env, (17, 19)),
+    ],
+    ids=["Lava_Donut_Env", "LavaDonutEnv_16", "Lava_Donut_Long_Env"],
+)
+def test_lava_donut_layout_cache(env_cls, sizes):
+    def make(size, **kwargs):
+        if size is not None:
+            kwargs["size"] = size
+        return env_cls(**kwargs)
+
+    # The first reset builds the layout, the second one reuses it
+    for size, plus_color in [
+        (sizes[0], "red"),
+        (sizes[0], "red"),
+        (sizes[1], "red"),
+        (sizes[0], "green"),
+    ]:
+        env = make(size, plus_color=plus_color)
+        for seed in (0, 1):
+            env.reset(seed=seed)
+            expected = _direct_layout(make(size, plus_color=plus_color))
+            assert np.array_equal(env.grid.encode(), expected)
+        env.close()
+
+
+def test_lroom_layout_cache():
+
+    env = LEnv(size=16, Lwidth=8, Lheight=6)
+
+    # Reset again after changing the size, the L shape and the plus color
+    for size, lwidth, lheight, plus_color in [
+        (16, 8, 6, "red"),
+        (16, 8, 6, "red"),
+        (20, 8, 6, "red"),
+        (20, 12, 10, "red"),
+        (20, 12, 10, "green"),
+    ]:
+        env.width = env.height = size
+        env.Lwidth, env.Lheight = lwidth, lheight
+        env.plus_color = plus_color
+        env.reset(seed=0)
+
+        ref = LEnv(size=size, Lwidth=lwidth, Lheight=lheight, plus_color=plus_color)
+        assert np.array_equal(env.grid.encode(), _direct_layout(ref))
+    env.close()
+
+
+def test_lava_donut_layout_cache_after_lwidth_change():
+    env = Lava_Donut_Env(size=20, Lwidth=10)
+    env.reset(seed=0)
+    env.Lwidth = 8
+    env.reset(seed=0)
+
+    # The layout cached for Lwidth=8 is now shared with fresh environments
+    for env in (env, Lava_Donut_Env(size=20, Lwidth=8)):
+        env.reset(seed=0)
+        ref = Lava_Donut_Env(size=20, Lwidth=8)
+        assert np.array_equal(env.grid.encode(), _direct_layout(ref))
+        assert np.array_equal(env._valid_mask, ref._valid_agent_mask(20, 20))
+
+
+def test_fakelava_seeded_start():
+    # Start drawn by the original place_obj rejection sampling
+    env = gym.make("MiniGrid-FakeLava-5x5-3x4-v0").unwrapped
+    env.reset(seed=0)
+    assert tuple(env.agent_pos) == (21, 12)
+    assert env.agent_dir == 2
+    env.close()
+
+
+def test_fakelava_first_reset_without_regenerate():
+    env = FakeLavaEnv()
+    env.regenerate = False
+    env.reset(seed=0)
+    assert env.grid.get(*env.agent_pos) is None
+    env.close()
+
+
+def test_fakelava_forward_sees_grid_changes():
+    env = FakeLavaEnv()
+    env.reset(seed=0)
+    env.agent_pos, env.agent_dir = (3, 2), 0
+    assert env.grid.get(4, 2) is None
+
+    # Wall off the empty cell ahead, then turn it into lava
+    env.grid.set(4, 2, Wall())
+    _, _, terminated, _, _ = env.step(env.actions.forward)
+    assert env.agent_pos == (3, 2) and not terminated
+
+    env.grid.set(4, 2, Lava())
+    _, _, terminated, _, _ = env.step(env.actions.forward)
+    assert env.agent_pos == (4, 2) and terminated
+    env.close()
+
+
+def _cells_of_type(grid, obj_type):
+    return {
+        (x, y)
+        for x in range(grid.width)
+        for y in range(grid.height)
+        if grid.get(x, y) is not None and grid.get(x, y).type == obj_type
+    }
+
+
+def _border(width, height):
+    return {
+        (x, y)
+        for x in range(width)
+        for y in range(height)
+        if x in (0, width - 1) or y in (0, height - 1)
+    }
+
+
+def _lava_donut_rooms(lw2, h2):
+    """Hand-listed walls, gates and lava of the Lava_Donut_Env rooms"""
+    walls = {(x, y) for x in range(lw2, lw2 + 7) for y in (h2 - 3, h2 + 3)}
+    walls |= {(x, y) for x in (lw2, lw2 + 3, lw2 + 6) for y in range(h2 - 3, h2 + 4)}
+    gates = {(lw2 + dx, y) for dx in (1, 2, 4, 5) for y in (h2 - 3, h2 + 3)}
+    gates |= {(x, h2 + dy) for x in (lw2, lw2 + 6) for dy in (-1, 0, 1)}
+    return walls - gates, gates, {(lw2 + 2, h2)}, {(lw2 + 4, h2)}
+
+
+def _check_lava_donut_rooms(env, walls, gates, fake_lava, lava):
+    grid = env.grid
+    assert _cells_of_type(grid, "wall") == walls | _border(grid.width, grid.height)
+    assert _cells_of_type(grid, "door") == gates
+    assert _cells_of_type(grid, "fake_lava") == fake_lava
+    assert _cells_of_type(grid, "lava") == lava
+    # The agent never starts in the lava rooms
+    for x, y in fake_lava | lava:
+        assert not env._valid_mask[x, y]
+
+
+def test_lava_donut_layout_positions():
+    env = LavaDonutEnv_16()
+    for seed in (0, 1):
+        env.reset(seed=seed)
+        _check_lava_donut_rooms(env, *_lava_donut_rooms(5, 8))
+    env.close()
+
+    # Rooms of the long donut, on a 19x15 grid
+    env = Lava_Donut_Long_Env()
+    for seed in (0, 1):
+        env.reset(seed=seed)
+        walls = {(x, y) for x in range(5, 14) for y in (5, 9)}
+        walls |= {(x, y) for x in (5, 9, 13) for y in range(5, 10)}
+        gates = {(x, y) for x in (6, 7, 8, 10, 11, 12) for y in (5, 9)}
+        gates |= {(x, y) for x in (5, 9, 13) for y in (6, 7, 8)}
+        _check_lava_donut_rooms(env, walls - gates, gates, {(7, 7)}, {(11, 7)})
+    env.close()
+
+
+def test_lava_donut_public_attribute_changes():
+    env = LavaDonutEnv_16()
+    env.reset(seed=0)
+    # The triangle fills the first slot at (1, 1)
+    assert env.grid.get(2, 1).color == "blue"
+
+    env.Lwidth = 8
+    env.order = "XDTP"
+    for seed in (0, 1):
+        env.reset(seed=seed)
+        _check_lava_donut_rooms(env, *_lava_donut_rooms(4, 8))
+        # The yellow x now fills the first slot
+        assert env.grid.get(2, 1).color == "yellow"
+        assert env.grid.get(*env.agent_pos) is None
+        x, y = env.agent_pos
+        assert not (4 < x < 10 and 5 < y < 11)
+    env.close()
+
+    # A fresh env with the same configuration gets the same layout
+    fresh = LavaDonutEnv_16(Lwidth=8, order="XDTP")
+    fresh.reset(seed=0)
+    assert np.array_equal(fresh.grid.encode(), env.grid.encode())